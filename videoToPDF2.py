@@ -8,23 +8,104 @@ import cv2
 import numpy as np
 import time
 import os
+import hashlib
+import re
+import functools
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import mss
+import objc
 from Quartz import (
     CGWindowListCopyWindowInfo,
     kCGWindowListOptionAll,
     kCGWindowListExcludeDesktopElements,
     kCGNullWindowID,
     CGDisplayBounds,
-    CGMainDisplayID
+    CGMainDisplayID,
+    CGRectMake,
+    CGWindowListCreateImage,
+    kCGWindowListOptionOnScreenOnly,
+    kCGWindowImageNominalResolution
 )
 from Quartz.CoreGraphics import (
-    CGDisplayCreateImage,
     CGImageGetWidth,
     CGImageGetHeight,
+    CGImageGetBytesPerRow,
     CGImageGetDataProvider,
     CGDataProviderCopyData
 )
-from PIL import Image
+import img2pdf
+
+
+@functools.lru_cache(maxsize=1)
+def _main_display_bounds():
+    """
+    Bounds of the main display as (x, y, width, height)
+    
+    Cached so the CoreGraphics display query runs once per process.
+    """
+    with objc.autorelease_pool():
+        bounds = CGDisplayBounds(CGMainDisplayID())
+        return (
+            int(bounds.origin.x),
+            int(bounds.origin.y),
+            int(bounds.size.width),
+            int(bounds.size.height)
+        )
+
+
+def mean_abs_diff(gray1, gray2):
+    """
+    Mean absolute pixel difference of two grayscale images, scaled to 0-1
+    
+    OpenCV's L1 norm computes this in one vectorized pass without
+    materializing a difference image.
+    
+    Args:
+        gray1: First grayscale image (uint8 numpy array)
+        gray2: Second grayscale image (uint8 numpy array)
+        
+    Returns:
+        Float between 0 (identical) and 1
+    """
+    return cv2.norm(gray1, gray2, cv2.NORM_L1) / (gray1.size * 255.0)
+
+
+def structural_similarity(gray1, gray2):
+    """
+    Mean structural similarity (SSIM) of two grayscale images
+    
+    Uses the 11x11 Gaussian window from Wang et al. (2004). Unlike a raw
+    pixel difference, SSIM stays close to 1 for small local changes such
+    as a moving cursor or a ticking player timer.
+    
+    Args:
+        gray1: First grayscale image (uint8 numpy array)
+        gray2: Second grayscale image (uint8 numpy array)
+        
+    Returns:
+        SSIM score, 1.0 for identical images
+    """
+    c1 = (0.01 * 255) ** 2
+    c2 = (0.03 * 255) ** 2
+    
+    img1 = gray1.astype(np.float32)
+    img2 = gray2.astype(np.float32)
+    
+    mu1 = cv2.GaussianBlur(img1, (11, 11), 1.5)
+    mu2 = cv2.GaussianBlur(img2, (11, 11), 1.5)
+    mu1_sq = mu1 * mu1
+    mu2_sq = mu2 * mu2
+    mu1_mu2 = mu1 * mu2
+    
+    sigma1_sq = cv2.GaussianBlur(img1 * img1, (11, 11), 1.5) - mu1_sq
+    sigma2_sq = cv2.GaussianBlur(img2 * img2, (11, 11), 1.5) - mu2_sq
+    sigma12 = cv2.GaussianBlur(img1 * img2, (11, 11), 1.5) - mu1_mu2
+    
+    ssim_map = ((2 * mu1_mu2 + c1) * (2 * sigma12 + c2)) / \
+               ((mu1_sq + mu2_sq + c1) * (sigma1_sq + sigma2_sq + c2))
+    
+    return cv2.mean(ssim_map)[0]
 
 
 class MacOSScreenCapture:
@@ -39,41 +120,100 @@ class MacOSScreenCapture:
         """
         self.region = region
         # Store full screen dimensions for scaling calculations
-        bounds = CGDisplayBounds(CGMainDisplayID())
-        self.screen_width = int(bounds.size.width)
-        self.screen_height = int(bounds.size.height)
+        _, _, self.screen_width, self.screen_height = _main_display_bounds()
         
-    def capture_frame(self):
-        """Capture a single frame from the screen using PIL for proper handling"""
-        from PIL import ImageGrab
+        # Keep a single mss grabber for the whole session instead of
+        # spinning up a new capture backend on every frame
+        self._sct = mss.mss()
+        if self.region and len(self.region) == 4:
+            x, y, w, h = self.region
+            self._monitor = {'left': x, 'top': y, 'width': w, 'height': h}
+        else:
+            # Full screen capture (monitor 0 is the union of all displays)
+            self._monitor = self._sct.monitors[1]
+        self._rect = CGRectMake(self._monitor['left'], self._monitor['top'],
+                                self._monitor['width'], self._monitor['height'])
         
+        # Scratch buffers reused by capture_thumbnail on every poll
+        self._thumbnail_bgra = None
+        self._thumbnail = None
+        
+    def capture_frame(self):
+        """Capture a single frame from the screen as a BGR numpy array"""
         try:
-            # Use PIL's screen capture for region or full screen
-            if self.region and len(self.region) == 4:
-                x, y, w, h = self.region
-                bbox = (x, y, x + w, y + h)
-                pil_image = ImageGrab.grab(bbox=bbox)
-            else:
-                # Full screen capture
-                pil_image = ImageGrab.grab()
-            
-            # Convert PIL image to numpy array (RGB format)
-            img_array = np.array(pil_image)
+            raw = self._sct.grab(self._monitor)
             
-            # Convert RGB to BGR for OpenCV
-            img_bgr = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
+            # mss hands back BGRA pixels, so dropping alpha leaves BGR
+            # for OpenCV without a colour conversion pass. Wrap the raw
+            # buffer directly (.bgra would copy it into bytes first); every
+            # grab allocates a new buffer, so the returned view isn't
+            # overwritten by the next capture
+            img_bgra = np.frombuffer(raw.raw, dtype=np.uint8).reshape(raw.height, raw.width, 4)
             
-            return img_bgr
+            return img_bgra[:, :, :3]
             
         except Exception as e:
             print(f"Error capturing frame: {e}")
             return None
+    
+    def capture_thumbnail(self, size=(512, 320)):
+        """
+        Capture a small BGR frame for change detection
+        
+        The region is grabbed at nominal (non-retina) resolution, so a poll
+        reads a quarter of the pixels of capture_frame on retina displays.
+        
+        Args:
+            size: Tuple of (width, height) of the returned thumbnail
+            
+        Returns:
+            BGR numpy array or None. The array is reused by the next call.
+        """
+        try:
+            with objc.autorelease_pool():
+                image = CGWindowListCreateImage(
+                    self._rect,
+                    kCGWindowListOptionOnScreenOnly,
+                    kCGNullWindowID,
+                    kCGWindowImageNominalResolution
+                )
+                width = CGImageGetWidth(image)
+                height = CGImageGetHeight(image)
+                bytes_per_row = CGImageGetBytesPerRow(image)
+                data = CGDataProviderCopyData(CGImageGetDataProvider(image))
+                
+                # Rows may be padded past width * 4 bytes
+                img_bgra = np.frombuffer(data, dtype=np.uint8).reshape(height, bytes_per_row)
+                img_bgra = img_bgra[:, :width * 4].reshape(height, width, 4)
+                
+                # Resize the 4-channel image (slicing off alpha first would force
+                # a full-size copy); this also copies the pixels out before the
+                # CG buffer is released
+                self._thumbnail_bgra = cv2.resize(img_bgra, size, dst=self._thumbnail_bgra,
+                                                  interpolation=cv2.INTER_AREA)
+                self._thumbnail = cv2.cvtColor(self._thumbnail_bgra, cv2.COLOR_BGRA2BGR,
+                                               dst=self._thumbnail)
+                return self._thumbnail
+            
+        except Exception as e:
+            print(f"Error capturing thumbnail: {e}")
+            return None
+    
+    def close(self):
+        """Release the grabber's OS resources"""
+        sct = getattr(self, '_sct', None)
+        if sct is not None:
+            sct.close()
+            self._sct = None
+    
+    def __del__(self):
+        self.close()
 
 
 class SlideCapture:
     """Captures slides when they change and saves as PDF"""
     
-    def __init__(self, output_dir="slides", sensitivity=0.05, check_interval=1.0):
+    def __init__(self, output_dir="slides", sensitivity=0.05, check_interval=1.0, diff_roi_margin=0.05):
         """
         Initialize slide capture
         
@@ -81,13 +221,23 @@ class SlideCapture:
             output_dir: Directory to save slides
             sensitivity: How different frames need to be to count as a change (0-1)
             check_interval: How often to check for changes (seconds)
+            diff_roi_margin: Fraction of each edge ignored by change detection (0-0.5),
+                so player controls and browser chrome don't register as new slides
         """
         self.output_dir = output_dir
         self.sensitivity = sensitivity
         self.check_interval = check_interval
+        # Keep the margin in [0, 0.45] so the cropped thumbnail is never empty
+        self.diff_roi_margin = min(max(diff_roi_margin, 0.0), 0.45)
+        self.max_check_interval = 5.0  # Longest back-off interval while the screen is static
         self.slides = []
+        self._last_hash = None
+        self._io_pool = None  # Background slide writer for the current session
         self.is_capturing = False
-        self.last_frame = None
+        self._last_small_gray = None  # Thumbnail of the last captured frame
+        self.diff_size = (256, 256)  # Thumbnail size used for change detection
+        self._gray_scratch = None  # Grayscale buffer reused by small_gray on every poll
+        self.max_slide_dimension = 1920  # Longest side of saved slides, in pixels
         
         # Create output directory
         os.makedirs(output_dir, exist_ok=True)
@@ -103,11 +253,14 @@ class SlideCapture:
             Tuple of (x, y, width, height) or None
         """
         try:
-            # Get ALL windows, including those on other Spaces/Desktops
-            window_list = CGWindowListCopyWindowInfo(
-                kCGWindowListOptionAll | kCGWindowListExcludeDesktopElements,
-                kCGNullWindowID
-            )
+            # Get ALL windows, including those on other Spaces/Desktops.
+            # Copy them into Python dicts inside an autorelease pool so the
+            # CoreGraphics window array is freed as soon as we're done with it
+            with objc.autorelease_pool():
+                window_list = [dict(window) for window in CGWindowListCopyWindowInfo(
+                    kCGWindowListOptionAll | kCGWindowListExcludeDesktopElements,
+                    kCGNullWindowID
+                )]
             
             # System apps and development tools to 
             ignored_apps = ["Control Center", "SystemUIServer", "Dock", "Window Server", 
@@ -119,6 +272,19 @@ class SlideCapture:
             # Ignore windows with these terms in the title
             ignored_title_terms = ["Claude", "claude.ai"]
             
+            # Set lookup for app names; each term list becomes one
+            # case-insensitive regex so a window needs a single scan
+            ignored_apps = frozenset(ignored_apps)
+            ignored_re = re.compile('|'.join(re.escape(term) for term in ignored_title_terms),
+                                    re.IGNORECASE)
+            # The lookahead reports overlapping matches, and at each position the
+            # alternation picks the earliest keyword, so no keyword is shadowed
+            keyword_re = re.compile('(?=(' + '|'.join(re.escape(k) for k in keywords) + '))',
+                                    re.IGNORECASE)
+            keyword_priority = {}
+            for i, keyword in enumerate(keywords):
+                keyword_priority.setdefault(keyword.lower(), i)
+            
             print(f"\nScanning {len(window_list)} windows across all desktops...")
             
             matches = []
@@ -142,7 +308,7 @@ class SlideCapture:
                     continue
                 
                 # Skip windows with ignored terms in title
-                if any(term.lower() in title.lower() for term in ignored_title_terms):
+                if ignored_re.search(title):
                     continue
                 
                 # Skip very small windows (likely UI elements)
@@ -155,18 +321,18 @@ class SlideCapture:
                     continue
                 
                 # Check if any keyword matches
-                search_text = f"{title} {owner}".lower()
-                for keyword in keywords:
-                    if keyword.lower() in search_text:
-                        matches.append({
-                            'title': title,
-                            'owner': owner,
-                            'bounds': bounds,
-                            'keyword': keyword,
-                            'priority': keywords.index(keyword),
-                            'layer': layer
-                        })
-                        break
+                found = keyword_re.findall(f"{title} {owner}")
+                if found:
+                    # Earlier keywords take priority
+                    priority = min(keyword_priority[k.lower()] for k in found)
+                    matches.append({
+                        'title': title,
+                        'owner': owner,
+                        'bounds': bounds,
+                        'keyword': keywords[priority],
+                        'priority': priority,
+                        'layer': layer
+                    })
             
             # Show Chrome windows for debugging
             if all_chrome_windows:
@@ -229,40 +395,113 @@ class SlideCapture:
     
     def get_full_screen_region(self):
         """Get the bounds of the main display"""
-        bounds = CGDisplayBounds(CGMainDisplayID())
-        return (
-            int(bounds.origin.x),
-            int(bounds.origin.y),
-            int(bounds.size.width),
-            int(bounds.size.height)
-        )
+        return _main_display_bounds()
     
-    def frames_are_different(self, frame1, frame2):
+    def small_gray(self, frame):
         """
-        Check if two frames are different enough to be considered a new slide
+        Downsample a frame to a grayscale thumbnail used for change detection
+        
+        Borders (diff_roi_margin of each edge) are cropped off, since player
+        controls, timers and browser chrome live there. The result is a view
+        of a scratch buffer that is reused by the next call, so copy it if
+        it needs to be kept.
+        """
+        if (frame.shape[1], frame.shape[0]) != self.diff_size:
+            frame = cv2.resize(frame, self.diff_size, interpolation=cv2.INTER_AREA)
+        self._gray_scratch = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self._gray_scratch)
+        
+        h, w = self._gray_scratch.shape
+        # Clamp so a margin set after construction still leaves pixels to compare
+        m = min(max(int(min(h, w) * self.diff_roi_margin), 0), (min(h, w) - 1) // 2)
+        return self._gray_scratch[m:h - m, m:w - m]
+    
+    def frames_are_different(self, small_gray):
+        """
+        Check if a frame is different enough from the last slide to be considered a new slide
+        
+        Comparison is done on small grayscale thumbnails - the result is a
+        single threshold, so scanning every pixel of the full frame buys nothing.
         
         Args:
-            frame1: First frame (numpy array)
-            frame2: Second frame (numpy array)
+            small_gray: Grayscale thumbnail of the new frame (see small_gray)
             
         Returns:
             Boolean indicating if frames are different
         """
-        if frame1 is None or frame2 is None:
+        if self._last_small_gray is None:
             return True
         
-        if frame1.shape != frame2.shape:
+        # Calculate mean pixel difference
+        diff_percentage = mean_abs_diff(self._last_small_gray, small_gray)
+        
+        return diff_percentage > self.sensitivity
+    
+    def frames_are_different_ssim(self, small_gray):
+        """
+        Check if a frame is different from the last slide using structural similarity
+        
+        A raw pixel difference is used as a cheap pre-filter; SSIM is only
+        computed when that already indicates a possible change, so cursor
+        and timer motion don't produce duplicate slides.
+        
+        Args:
+            small_gray: Grayscale thumbnail of the new frame (see small_gray)
+            
+        Returns:
+            Boolean indicating if frames are different
+        """
+        if self._last_small_gray is None:
             return True
         
-        # Convert to grayscale for comparison
-        gray1 = cv2.cvtColor(frame1, cv2.COLOR_BGR2GRAY)
-        gray2 = cv2.cvtColor(frame2, cv2.COLOR_BGR2GRAY)
+        # Pre-filter on mean pixel difference
+        if not self.frames_are_different(small_gray):
+            return False
         
-        # Calculate structural similarity
-        difference = cv2.absdiff(gray1, gray2)
-        diff_percentage = np.sum(difference) / (difference.size * 255)
+        return 1.0 - structural_similarity(self._last_small_gray, small_gray) > self.sensitivity
+    
+    def save_slide(self, session_dir, frame, small_gray):
+        """
+        Save a slide image unless it is identical to the previous slide
         
-        return diff_percentage > self.sensitivity
+        Args:
+            session_dir: Directory for this session's slides
+            frame: Full-resolution frame to save
+            small_gray: Grayscale thumbnail of the frame, hashed for de-duplication
+            
+        Returns:
+            Boolean indicating if the slide was saved
+        """
+        slide_hash = hashlib.blake2b(small_gray.tobytes(), digest_size=8).digest()
+        if slide_hash == self._last_hash:
+            return False
+        
+        slide_filename = os.path.join(session_dir, f"slide_{len(self.slides) + 1:03d}.jpg")
+        # Resize and encode on a worker thread so the capture loop isn't stalled
+        self._io_pool.submit(self.write_slide_image, slide_filename, frame)
+        self.slides.append(slide_filename)
+        self._last_hash = slide_hash
+        return True
+    
+    def write_slide_image(self, slide_filename, frame):
+        """
+        Write a slide to disk as JPEG, capped at max_slide_dimension
+        
+        Retina captures are downscaled first; PDF viewers shrink them anyway,
+        so the extra pixels only cost encode time and file size. JPEG encodes
+        far faster than PNG, and img2pdf embeds the JPEG bytes in the PDF as-is.
+        
+        Args:
+            slide_filename: Path of the image to write
+            frame: Full-resolution BGR frame
+        """
+        height, width = frame.shape[:2]
+        scale = self.max_slide_dimension / max(height, width)
+        if scale < 1.0:
+            frame = cv2.resize(frame, (round(width * scale), round(height * scale)),
+                               interpolation=cv2.INTER_AREA)
+        
+        cv2.imwrite(slide_filename, frame,
+                    [cv2.IMWRITE_JPEG_QUALITY, 90, cv2.IMWRITE_JPEG_OPTIMIZE, 1])
     
     def start_capture(self, region=None):
         """
@@ -292,8 +531,9 @@ class SlideCapture:
         
         self.is_capturing = True
         self.slides = []
-        self.last_frame = None
-        slide_count = 0
+        self._last_hash = None
+        self._last_small_gray = None
+        self._io_pool = ThreadPoolExecutor(max_workers=2)
         
         print(f"Slide capture started!")
         print(f"Slides will be saved to: {session_dir}")
@@ -301,37 +541,65 @@ class SlideCapture:
         print(f"Check interval: {self.check_interval}s")
         print("Press Ctrl+C to stop and save PDF\n")
         
+        # Polling interval backs off while nothing changes
+        current_interval = self.check_interval
+        
         try:
             while self.is_capturing:
-                # Capture current frame
-                frame = capture.capture_frame()
+                tick_start = time.monotonic()
+                active = False
                 
-                if frame is not None:
+                # Capture a low-resolution frame for change detection
+                thumbnail = capture.capture_thumbnail(self.diff_size)
+                
+                if thumbnail is not None:
+                    small_gray = self.small_gray(thumbnail)
+                    
                     # Check if this is a new slide
-                    if self.frames_are_different(self.last_frame, frame):
-                        slide_count += 1
-                        slide_filename = os.path.join(session_dir, f"slide_{slide_count:03d}.png")
-                        
-                        # Save the slide
-                        cv2.imwrite(slide_filename, frame)
-                        self.slides.append(slide_filename)
-                        
-                        print(f"✓ Captured slide {slide_count}")
+                    if self.frames_are_different_ssim(small_gray):
+                        active = True
                         
-                        # Update last frame
-                        self.last_frame = frame.copy()
+                        # Grab the full-resolution image only once a change is detected
+                        frame = capture.capture_frame()
+                        if frame is not None:
+                            # Keep the thumbnail (small_gray is a reused scratch buffer)
+                            self._last_small_gray = small_gray.copy()
+                            
+                            # Save the slide
+                            if self.save_slide(session_dir, frame, self._last_small_gray):
+                                print(f"✓ Captured slide {len(self.slides)}")
                 
-                # Wait before next check
-                time.sleep(self.check_interval)
+                # Back off exponentially while the screen is static and
+                # snap back to the configured interval as soon as it changes
+                if active:
+                    current_interval = self.check_interval
+                else:
+                    current_interval = min(current_interval * 1.5,
+                                           max(self.max_check_interval, self.check_interval))
+                
+                # Wait until the next check is due, measured from the start of
+                # this one so capture and diff time don't add to the interval
+                elapsed = time.monotonic() - tick_start
+                if elapsed > current_interval:
+                    print(f"  ! Check took {elapsed:.2f}s, longer than the {current_interval:.2f}s interval "
+                          f"(consider a longer check interval or a smaller capture region)")
+                time.sleep(max(0.0, current_interval - elapsed))
                 
         except KeyboardInterrupt:
             print("\n\nStopping capture...")
             self.stop_capture(session_dir, timestamp)
+        finally:
+            capture.close()
     
     def stop_capture(self, session_dir, timestamp):
         """Stop capturing and create PDF"""
         self.is_capturing = False
         
+        # Wait for queued slides to finish writing
+        if self._io_pool is not None:
+            self._io_pool.shutdown(wait=True)
+            self._io_pool = None
+        
         if not self.slides:
             print("No slides captured!")
             return
@@ -343,28 +611,16 @@ class SlideCapture:
         pdf_filename = os.path.join(self.output_dir, f"slides_{timestamp}.pdf")
         
         try:
-            # Load all images
-            images = []
-            for slide_path in self.slides:
-                img = Image.open(slide_path)
-                # Convert to RGB if necessary
-                if img.mode != 'RGB':
-                    img = img.convert('RGB')
-                images.append(img)
+            # Embed the saved image files directly - img2pdf copies the
+            # encoded bytes into the PDF instead of decoding every slide
+            # into memory and re-encoding it
+            layout = img2pdf.get_fixed_dpi_layout_fun((100, 100))
+            with open(pdf_filename, 'wb') as pdf_file:
+                pdf_file.write(img2pdf.convert(self.slides, layout_fun=layout))
             
-            # Save as PDF
-            if images:
-                images[0].save(
-                    pdf_filename,
-                    save_all=True,
-                    append_images=images[1:],
-                    resolution=100.0,
-                    quality=95
-                )
-                
-                print(f"\n✓ PDF saved: {pdf_filename}")
-                print(f"  Total slides: {len(self.slides)}")
-                print(f"  Individual slides saved in: {session_dir}")
+            print(f"\n✓ PDF saved: {pdf_filename}")
+            print(f"  Total slides: {len(self.slides)}")
+            print(f"  Individual slides saved in: {session_dir}")
             
         except Exception as e:
             print(f"Error creating PDF: {e}")
@@ -389,7 +645,15 @@ def main():
     interval_input = input("Check interval in seconds (default 1.0): ").strip()
     check_interval = float(interval_input) if interval_input else 1.0
     
-    capturer = SlideCapture(sensitivity=sensitivity, check_interval=check_interval)
+    # Get border margin ignored by change detection
+    margin_input = input("Border to ignore when detecting changes, fraction of each edge (default 0.05): ").strip()
+    diff_roi_margin = float(margin_input) if margin_input else 0.05
+    if not 0 <= diff_roi_margin < 0.5:
+        print("Border must be at least 0 and below 0.5, using default 0.05")
+        diff_roi_margin = 0.05
+    
+    capturer = SlideCapture(sensitivity=sensitivity, check_interval=check_interval,
+                            diff_roi_margin=diff_roi_margin)
     
     # Auto-detect window
     print("\nAttempting to auto-detect lecture window...")